@@ -0,0 +1,34 @@
+#! /usr/bin/env python3
+
+# numba-compiled inner loops, entirely optional
+# importers are expected to fall back to numpy/python when this fails
+
+import numpy
+from numba import njit
+
+@njit(cache=True)
+def decode_block(readings, lux, decimal):
+    "gm1020 lux samples: readings (uint16) in, lux/decimal-point flags out"
+    for i in range(readings.shape[0]):
+        r = readings[i]
+        v = (r & 0xFFF) / 10.0
+        if r & 0x4000:
+            v *= 10.0
+        if r & 0x8000:
+            v *= 100.0
+        lux[i] = v
+        decimal[i] = (r & 0xC000) == 0
+
+@njit(cache=True)
+def pack_frame(bs):
+    "ut382 frames: validate prefix/terminator and pack the nibble pairs"
+    out = numpy.empty(15, numpy.uint8)
+    err = 0
+    for i in range(30):
+        if bs[i] & 0xF0 != 0x30:
+            err = 1
+    if bs[30] != 0x0D or bs[31] != 0x0A:
+        err = 1
+    for j in range(15):
+        out[j] = (bs[2*j] & 0x0F) | ((bs[2*j+1] & 0x0F) << 4)
+    return out, err
@@ -1,18 +1,30 @@
 #! /usr/bin/env python3
 
 import sys
-import copy
 import glob
 import time
+import struct
 import argparse
 import datetime
 import platform
+from concurrent.futures import ThreadPoolExecutor
 
 import serial
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    from _decode_jit import decode_block
+except ImportError:
+    decode_block = None
+
 baud = 19200
 timeout = 0.05
 default_timestamp = '%Y-%m-%d %H:%M:%S.%f'
+live_frame = (0x33, 0x22, 0x01, 0x11)  # fixed bytes 0,1,4,7 of a live reply
 com = None
 
 """
@@ -38,9 +50,25 @@ message_bits = {
     'footcandle': [0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x02, 0x00],
     }
 
+# freeze the commands into immutable bytes once, instead of converting
+# a list on every send()
+message_bits = {k: bytes(v) for k,v in message_bits.items()}
+# every message is exactly 8 bytes, so treat them as big-endian uint64s
+# and build settings with single bit-ops instead of per-byte loops
+message_ints = {k: int.from_bytes(v, 'big') for k,v in message_bits.items()}
+
+def open_port(port):
+    c = serial.Serial(port, baud, timeout=timeout)
+    try:
+        # default usb-serial latency timer is 16ms, way too slow
+        c.set_low_latency_mode(True)
+    except:
+        pass
+    return c
+
 def init(port):
     global com
-    com = serial.Serial(port, baud, timeout=timeout)
+    com = open_port(port)
 
 def cleanup():
     send(message_bits['live_stop'])
@@ -122,7 +150,7 @@ def load_options():
             sys.exit()
 
     if options.path == '-':
-        option.path = ''
+        options.path = ''
 
     setup_actions = ['download', 'show_setup', 'unit', 'shutdown',
                      'shutdown_timer', 'logging', 'logging_timer']
@@ -134,8 +162,24 @@ def load_options():
 
     return options
 
+def probe(port):
+    "open one candidate port and look for the meter"
+    try:
+        c = open_port(port)
+    except:
+        return None
+    try:
+        c.write(message_bits['status'])
+        if len(c.read(8)) == 8:
+            return c
+    except:
+        pass
+    c.close()
+    return None
+
 def port_search():
     "sets up com, returns port"
+    global com
     os_type = platform.system()
     if os_type not in ['Linux', 'Windows', 'Darwin']:
         print("Unknown OS", os_type)
@@ -147,47 +191,40 @@ def port_search():
         pattern = glob.glob('/dev/ttyUSB*')
     if os_type == 'Darwin':
         pattern = glob.glob('/dev/tty.usbserial-*')
-    for port in pattern:
-        try:
-            init(port)
-        except:
-            port = False
-            #cleanup()
-        if port:
-            send(message_bits['status'])
-            reply = listen()
-            if len(reply) != 8:
-                cleanup()
+    if not pattern:
+        return None
+    # probe every candidate at once, each failure costs a full timeout
+    found = None
+    with ThreadPoolExecutor(max_workers=len(pattern)) as pool:
+        for port, c in zip(pattern, pool.map(probe, pattern)):
+            if c is None:
                 continue
-            return port
-    return None
+            if found is None:
+                found = port
+                com = c
+            else:
+                c.close()
+    return found
 
 def checksum(message):
-    message[-1] = sum(message[:-1]) % 256
-    return message
+    return message | (sum(message.to_bytes(8, 'big')[:-1]) % 256)
 
 def byte_add(m1, m2):
-    assert len(m1) == len(m2)
-    return [b1 | b2 for b1,b2 in zip(m1, m2)]
+    return m1 | m2
 
 def power_time_set(message, minutes):
     assert 1 <= minutes <= 240
-    message[2] = minutes
-    return message
+    return message | (minutes << 40)  # byte 2
 
 def logging_time_set(message, seconds):
     assert 1 <= seconds <= 3600
-    high = seconds >> 8
-    low  = seconds % 256
-    message[4] = high
-    message[5] =  low
-    return message
+    return message | (seconds << 16)  # bytes 4 and 5
 
 def generate_settings(**kwargs):
-    message = copy.copy(message_bits['configure'])
+    message = message_ints['configure']
     for k in ['auto_power', 'auto_log', 'fahrenheit', 'footcandle']:
         if k in kwargs and kwargs[k] == True:
-            message = byte_add(message, message_bits[k])
+            message = byte_add(message, message_ints[k])
     power_time = 5
     logging_time = 300
     if 'power_time' in kwargs:
@@ -197,20 +234,13 @@ def generate_settings(**kwargs):
     message = power_time_set(message, power_time)
     message = logging_time_set(message, logging_time)
     message = checksum(message)
-    return message
+    return message.to_bytes(8, 'big')
 
 def send(message):
-    for b in message:
-        try:
-            com.write(b.to_bytes(1, byteorder='big'))
-        except AttributeError:  # python2
-            com.write([b])
+    com.write(message)
 
 def listen(n=8):
-    reply = list(com.read(n))
-    if reply and type(reply[0]) == str:  # python2
-        reply = [ord(n) for n in reply]
-    return reply
+    return com.read(n)
 
 def send_and_confirm(message):
     send(message)
@@ -232,14 +262,16 @@ def retrieve_settings():
     reply = listen()
     # and now extract everything
     # similar to the conf_set format
-    conf['samples']    = 256*int(reply[0]) + int(reply[1])
-    conf['auto_power'] = bool(reply[2])
-    conf['power_time'] =  int(reply[3])
-    conf['auto_log']   = bool(reply[4])
-    conf['logging_time'] = 256*int(reply[5]) + int(reply[6])
-    conf['fahrenheit'] = bool(reply[7] & 0x01)
+    samples, auto_power, power_time, auto_log, logging_time, flags = \
+        struct.unpack('>HBBBHB', reply)
+    conf['samples']    = samples
+    conf['auto_power'] = bool(auto_power)
+    conf['power_time'] = power_time
+    conf['auto_log']   = bool(auto_log)
+    conf['logging_time'] = logging_time
+    conf['fahrenheit'] = bool(flags & 0x01)
     conf['centigrade'] = not conf['fahrenheit']
-    conf['footcandle'] = bool(reply[7] & 0x02)
+    conf['footcandle'] = bool(flags & 0x02)
     conf['lux']        = not conf['footcandle']
     return conf
 
@@ -257,6 +289,26 @@ def decode_lux(b1, b2):
         return '%.1f' % lux
     return '%i' % lux
 
+def decode_lux_values(readings):
+    "bulk decode_lux over a uint16 array, returns (lux, decimal point flags)"
+    if decode_block is not None:
+        lux = numpy.empty(len(readings), numpy.float64)
+        decimal = numpy.empty(len(readings), numpy.bool_)
+        decode_block(readings, lux, decimal)
+        return lux, decimal
+    lux = (readings & 0xFFF) / 10.0
+    lux[(readings & 0x4000) != 0] *= 10
+    lux[(readings & 0x8000) != 0] *= 100
+    decimal = (readings & 0xC000) == 0
+    return lux, decimal
+
+def decode_lux_block(readings):
+    "bulk decode_lux with the same string formatting"
+    lux, decimal = decode_lux_values(readings)
+    strings = numpy.where(decimal, numpy.char.mod('%.1f', lux),
+                          numpy.char.mod('%i', lux))
+    return strings.tolist()
+
 def decode_temp(b1, b2):
     temp = '%.1f' % ((b1*256 + b2) / 10.0)
     return temp
@@ -266,11 +318,14 @@ def live_monitor(strftime=None):
         strftime = default_timestamp
     com.timeout = 1  # wait for data
     send(message_bits['live_start'])
+    # hoisted lookups, the loop could run at 10+ Hz
+    now = datetime.datetime.now
+    listen_ = listen
     while True:
         try:
-            reply = listen()
-            t = datetime.datetime.now().strftime(strftime)
-            if reply[0] != 0x33 or reply[1] != 0x22 or reply[4] != 0x01 or reply[7] != 0x11:
+            reply = listen_()
+            t = now().strftime(strftime)
+            if (reply[0], reply[1], reply[4], reply[7]) != live_frame:
                 print('You have discovered something new!  Please report this bug. ', 
                       ' '.join('0x%x' % b for b in reply))
             temp = decode_temp(reply[5], reply[6])
@@ -282,6 +337,20 @@ def live_monitor(strftime=None):
         send(message_bits['live_stop'])
     com.timeout = timeout
 
+def read_n_live(n):
+    "grab n consecutive live-mode frames in one read"
+    com.timeout = n * 0.5 + 1  # the meter reports 2 frames per second
+    raw = com.read(8 * n)
+    com.timeout = timeout
+    return raw
+
+def decode_live_lux(raw):
+    "lux values from a block of live-mode frames"
+    frames = numpy.frombuffer(raw[:len(raw)//8*8], dtype=numpy.uint8).reshape(-1, 8)
+    readings = (frames[:,2].astype(numpy.uint16) << 8) | frames[:,3]
+    lux, decimal = decode_lux_values(readings)
+    return lux
+
 def one_shot(samples=1, duration=0):
     strftime = default_timestamp
     com.timeout = 1  # wait for data
@@ -308,15 +377,21 @@ def one_shot(samples=1, duration=0):
     com.timeout = timeout
     return {'time':tick, 'C':temp/length, 'lux':lux/length}
 
-def dump_memory():
-    # could be clever and use the number of samples
-    # or walk the whole thing instead
+def dump_memory(expected=1900):
+    # one bulk read instead of a 2-byte read per sample
     send(message_bits['dump_mem'])
-    while True:
-        reply = listen(2)
-        if not reply:
-            break
-        b1,b2 = reply
+    com.timeout = 2*expected / 1920.0 + 0.5  # 19200 baud 8N1
+    raw = com.read(2 * expected)
+    com.timeout = timeout
+    if numpy is not None:
+        readings = numpy.frombuffer(raw[:len(raw)//2*2], dtype='>u2')
+        ends = numpy.flatnonzero(readings == 0xFFFF)
+        if len(ends):
+            readings = readings[:ends[0]]
+        yield from decode_lux_block(readings.astype(numpy.uint16))
+        return
+    for i in range(0, len(raw) - 1, 2):
+        b1,b2 = raw[i], raw[i+1]
         if b1 == b2 == 255:
             break
         yield decode_lux(b1, b2)
@@ -340,7 +415,8 @@ def core(options):
 
     redirect = sys.stdout
     if options.path:
-        redirect = open(options.path, 'w', 1)
+        # no line buffering, the bulk paths flush once on close
+        redirect = open(options.path, 'w', buffering=65536)
 
     if options.show_setup:
         pretty_conf(conf)
@@ -350,13 +426,14 @@ def core(options):
         delta = datetime.timedelta(seconds=rate)
         stop_time = datetime.datetime.now()
         start_time = stop_time - delta * conf['samples']
-        redirect.write('time\tlux\n')
         strftime2 = options.strftime.replace('.%f', '')  # sensible?
-        for i, lux in enumerate(dump_memory()):
-            tick = str(i*rate + options.download_offset)
-            if options.download_backdate:
-                tick = (start_time + i*delta).strftime(strftime2)
-            redirect.write('%s\t%s\n' % (tick, lux))
+        luxes = list(dump_memory(conf['samples']))
+        if options.download_backdate:
+            ticks = ((start_time + i*delta).strftime(strftime2) for i in range(len(luxes)))
+        else:
+            ticks = (str(i*rate + options.download_offset) for i in range(len(luxes)))
+        redirect.write('time\tlux\n')
+        redirect.writelines('%s\t%s\n' % tl for tl in zip(ticks, luxes))
 
     if options.wipe:
         status = send_and_confirm(message_bits['clear_mem'])
@@ -402,6 +479,7 @@ def core(options):
         redirect.write('time\tlux\tC\n')
         for data in live_monitor(options.strftime):
             redirect.write('\t'.join([data['time'], data['lux'], data['C']]) + '\n')
+            redirect.flush()  # keep live rows visible as they arrive
 
     if options.path:
         redirect.close()
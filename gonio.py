@@ -4,6 +4,7 @@ import sys
 import json
 import time
 import argparse
+import datetime
 from collections import OrderedDict
 
 import gm1020
@@ -85,19 +86,23 @@ def run_gm1020_test(conf):
     maestro.set_pan(int(conf['pan-min']))
     while maestro.is_moving():
         time.sleep(conf['settle'])
-    meter = gm1020.live_monitor()
+    gm1020.send(gm1020.message_bits['live_start'])
 
-    for i in range(int(conf['pan-min']), int(conf['pan-max']), int(maestro.step_size())):
+    n = int(conf['samples'])
+    step = int(maestro.step_size())
+    # every step is the same size, so the travel time is known up front
+    wait = maestro.move_time(step) + conf['settle']
+    for i in range(int(conf['pan-min']), int(conf['pan-max']), step):
         maestro.set_pan(i)
-        while maestro.is_moving():
+        time.sleep(wait)
+        while maestro.is_moving():  # safety net, normally already done
             time.sleep(conf['settle'])
-        samples = []
-        # discard
+        # discard readings taken while still moving
         gm1020.com.reset_input_buffer()
-        while len(samples) < conf['samples']:
-            samples.append(next(meter))
-        lux = sum(float(s['lux']) for s in samples) / len(samples)
-        row = [samples[0]['time'], str(i), str(lux)]
+        tick = datetime.datetime.now().strftime(gm1020.default_timestamp)
+        raw = gm1020.read_n_live(n)
+        lux = gm1020.decode_live_lux(raw).mean()
+        row = [tick, str(i), str(lux)]
         redirect.write('\t'.join(row) + '\n')
 
     if conf['save']:
@@ -1,9 +1,10 @@
 #! /usr/bin/env python3
 
 import sys
-import datetime
 from math import sqrt, sin, cos, radians, pi, hypot
 
+import numpy
+
 try:
     import maestro
 except:
@@ -19,92 +20,66 @@ runtime fade compensation
 """
 
 def load_raw(path):
-    "first line is csv k/v pairs, second is tsv headers, and then rest is tsv data"
+    "first line is csv k/v pairs, second is tsv headers, and then rest is tsv columns"
     f = open(path)
     conf = [kv.split(':') for kv in next(f).split(',')]
     conf = dict((k.strip(),float(v.strip())) for k,v in conf)
-    header = next(f).strip().split('\t')
-    data = []
-    for line in f:
-        values = line.strip().split('\t')
-        data.append(dict(zip(header, values)))
+    table = numpy.genfromtxt(f, delimiter='\t', names=True,
+        dtype=['datetime64[us]', 'f8', 'f8'],
+        converters={0: lambda t: numpy.datetime64(str(t).replace(' ', 'T'))})
     f.close()
-    for line in data:
-        line['time'] = datetime.datetime.strptime(line['time'], '%Y-%m-%d %H:%M:%S.%f')
-        line['pulse'] = float(line['pulse'])
-        line['lux'] = float(line['lux'])
-    return conf, data
+    arrays = dict((name, table[name]) for name in table.dtype.names)
+    return conf, arrays
 
-def mid_error(data, mid):
+def mid_error(cds, mid):
     # lazy, assumes evenly spaced measurements
-    cds = [d['candela'] for d in data]
     left = cds[mid-1::-1]
     right = cds[mid+1:]
-    error = sum((c1-c2)**2 for c1,c2 in zip(left, right)) / min(len(left), len(right))
-    return error
+    k = min(len(left), len(right))
+    return ((left[:k] - right[:k])**2).mean()
 
-def center(data):
+def center(arrays):
     "find the best-fit midpoint"
-    #mid = len(data) // 2
-    mid = max((line['lux'], i) for i,line in enumerate(data))[1]
-    error = mid_error(data, mid)
-    while True:
-        error_L = mid_error(data, mid-1)
-        error_R = mid_error(data, mid+1)
-        if error_L < error:
-            error = error_L
-            mid -= 1
-            continue
-        if error_R < error:
-            error = error_R
-            mid += 1
-            continue
-        break
-    return mid
+    cds = arrays['candela']
+    n = len(cds)
+    # the symmetry point is always near the brightest sample, so score a
+    # window of candidates in one pass and take the best
+    peak = int(numpy.argmax(arrays['lux']))
+    window = range(max(1, peak - 10), min(n - 1, peak + 11))
+    errors = [mid_error(cds, mid) for mid in window]
+    return window[int(numpy.argmin(errors))]
 
-def fold_over(data, mid):
+def fold_over(arrays, mid):
     "coverts ±90 to 0-90"
-    data2 = []
-    left = data[mid-1::-1]
-    right = data[mid+1:]
-    middle = data[mid]
-    angle_offset = middle['angle']
-    data2.append({'angle':0, 'candela':middle['candela']})
-    for i in range(max(len(left), len(right))):
-        c_total = 0
-        c_samples = 0
-        angle = None
-        try:
-            c_total += left[i]['candela']
-            c_samples += 1
-            angle = abs(left[i]['angle'] - angle_offset)
-        except IndexError:
-            pass
-        try:
-            c_total += right[i]['candela']
-            c_samples += 1
-            angle = abs(right[i]['angle'] - angle_offset)
-        except IndexError:
-            pass
-        assert angle is not None
-        c_ave = c_total / c_samples
-        data2.append({'angle':angle, 'candela':c_ave})
-    return data2
+    cds = arrays['candela']
+    angles = arrays['angle']
+    left = cds[mid-1::-1]
+    right = cds[mid+1:]
+    n = max(len(left), len(right))
+    totals = numpy.zeros(n)
+    counts = numpy.zeros(n)
+    totals[:len(left)] += left
+    counts[:len(left)] += 1
+    totals[:len(right)] += right
+    counts[:len(right)] += 1
+    angle_offset = angles[mid]
+    folded_angles = numpy.empty(n)
+    folded_angles[:len(left)] = numpy.abs(angles[mid-1::-1] - angle_offset)
+    # where both sides exist the right side's angle wins, as before
+    folded_angles[:len(right)] = numpy.abs(angles[mid+1:] - angle_offset)
+    return {'angle': numpy.concatenate(([0.0], folded_angles)),
+            'candela': numpy.concatenate(([cds[mid]], totals / counts))}
 
-def clean(data, scale=1.0, distance=100, offset=0):
+def clean(arrays, scale=1.0, distance=100, offset=0):
     "convert lux to cd and apply all corrections"
-    for line in data:
-        angle = maestro.convert_deg(line['pulse'])
-        meters = distance / 100.0
-        meters -= cos(radians(angle)) * offset / 100.0
-        candela = line['lux'] * scale * meters**2
-        line['angle'] = angle
-        line['candela'] = candela
-    middle = center(data)
-    #print('midpoint:', data[middle])
-    folded = fold_over(data, middle)
-    for line in folded:
-        line['throw'] = sqrt(line['candela'] * 4)
+    angles = maestro.convert_deg(arrays['pulse'])  # pure arithmetic, broadcasts over arrays
+    meters = distance / 100.0 - numpy.cos(numpy.radians(angles)) * offset / 100.0
+    arrays['angle'] = angles
+    arrays['candela'] = arrays['lux'] * scale * meters**2
+    middle = center(arrays)
+    #print('midpoint:', middle)
+    folded = fold_over(arrays, middle)
+    folded['throw'] = numpy.sqrt(folded['candela'] * 4)
     return folded
 
 def cap_area(radius, angle):
@@ -115,25 +90,24 @@ def integrate_lumens(data):
     # simple midpoint integral
     # lumens = lux * meters area
     # works with un-evenly spaced data
-    lumens = 0
-    lumens += data[0]['candela'] * cap_area(1, data[1]['angle']/2.0)
-    for i in range(1, len(data) - 1):
-        angle1 = (data[i]['angle'] + data[i-1]['angle']) / 2.0
-        angle2 = (data[i]['angle'] + data[i+1]['angle']) / 2.0
-        lumens += data[i]['candela'] * (cap_area(1, angle2) - cap_area(1, angle1))
-    return lumens
+    # each boundary is shared by two rings, so compute its cap once
+    angles = data['angle']
+    cds = data['candela']
+    bounds = (angles[:-1] + angles[1:]) / 2.0
+    caps = 2 * pi * (1 - numpy.cos(numpy.radians(bounds)))
+    return cds[0] * caps[0] + (cds[1:-1] * numpy.diff(caps)).sum()
 
 def main(load_path, save_path):
-    conf, data = load_raw(load_path)
+    conf, arrays = load_raw(load_path)
     maestro.servo_conf = conf
     #print(conf)
-    folded = clean(data, scale=conf['scale'], distance=conf['distance'], offset=conf['offset'])
+    folded = clean(arrays, scale=conf['scale'], distance=conf['distance'], offset=conf['offset'])
     print('lumens:', integrate_lumens(folded))
     f = open(save_path, 'w')
     keys = ['angle', 'candela', 'throw']
     f.write('\t'.join(keys) + '\n')
-    for line in folded:
-        f.write('\t'.join(str(line[k]) for k in keys) + '\n')
+    for row in zip(*(folded[k] for k in keys)):
+        f.write('\t'.join(str(v) for v in row) + '\n')
     f.close()
 
 if __name__ == '__main__':
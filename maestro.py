@@ -3,6 +3,8 @@
 import glob
 import time
 import platform
+from math import sqrt
+from concurrent.futures import ThreadPoolExecutor
 
 import serial
 
@@ -48,6 +50,11 @@ servo_conf = []
 def init(port):
     global com
     com = serial.Serial(port, baud, timeout=timeout, bytesize=8, parity='N', stopbits=1)
+    try:
+        # default usb-serial latency timer is 16ms, way too slow
+        com.set_low_latency_mode(True)
+    except:
+        pass
     send([command_table['baud_detect']])
     send_command('velocity', 0, servo_conf['velocity'])
     send_command('acceleration', 0, servo_conf['acceleration'])
@@ -57,17 +64,10 @@ def cleanup():
 
 def send(message):
     #print(message, ['0x%02X' % b for b in message])
-    for b in message:
-        try:
-            com.write(b.to_bytes(1, byteorder='big'))
-        except AttributeError:  # python2
-            com.write([b])
+    com.write(bytes(message))
 
 def listen(n=8):
-    reply = list(com.read(n))
-    if reply and type(reply[0]) == str:  # python2
-        reply = [ord(n) for n in reply]
-    return reply
+    return com.read(n)
 
 def send_command(command, channel, n):
     command = command_table[command]
@@ -76,7 +76,7 @@ def send_command(command, channel, n):
     n = int(n)
     low = 0x7F & n
     high = 0x7F & (n >> 7)
-    send([command, channel, low, high])
+    send(bytes((command, channel, low, high)))
 
 def is_moving():
     send([command_table['get_state']])
@@ -99,11 +99,32 @@ def get_pan():
 def get_tilt():
     return get_position(1)
 
+# pan/tilt run hundreds of times per sweep, so their command+channel
+# prefixes are baked ahead of time and the generic dispatch is skipped
+_pan_target = bytes((command_table['target'], 0x00))
+_tilt_target = bytes((command_table['target'], 0x01))
+
 def set_pan(i):
-    send_command('target', 0, i*4)
+    n = i * 4
+    com.write(_pan_target + bytes((n & 0x7F, (n >> 7) & 0x7F)))
 
 def set_tilt(i):
-    send_command('target', 1, i*4)
+    n = i * 4
+    com.write(_tilt_target + bytes((n & 0x7F, (n >> 7) & 0x7F)))
+
+def move_time(delta_pulse):
+    "estimate seconds for a commanded move, trapezoidal velocity profile"
+    delta = abs(delta_pulse) * 4  # same 0.25 uS units as set_pan
+    v = servo_conf['velocity'] * 100       # 0.25uS/10mS -> units per second
+    a = servo_conf['acceleration'] * 1250  # 0.25uS/10mS/80mS -> units per second^2
+    if not v:
+        return 0.0  # 0 means unlimited
+    if not a:
+        return delta / v
+    if delta * a <= v * v:
+        # never reaches full speed
+        return 2 * sqrt(delta / a)
+    return delta / v + v / a
 
 def step_size():
     delta = servo_conf['pan-max'] - servo_conf['pan-min']
@@ -115,9 +136,27 @@ def convert_deg(pulse_width):
     dx = servo_conf['pan-max'] - servo_conf['pan-min']
     return ((pulse_width - servo_conf['pan-min']) / dx) * dy
 
+def probe(port):
+    "open one candidate port and look for a responding controller"
+    try:
+        c = serial.Serial(port, baud, timeout=timeout, bytesize=8, parity='N', stopbits=1)
+    except:
+        return None
+    try:
+        c.write(bytes((command_table['baud_detect'],)))
+        # ask for the pan position, same check init/get_pan used to make
+        c.write(bytes((command_table['get_position'], 0x00, 0x00, 0x00)))
+        if len(c.read(2)) == 2:
+            return c
+    except:
+        pass
+    c.close()
+    return None
+
 def port_search():
     "sets up com, returns boolean success"
     # interrogate device number?  (default #12)
+    global com
     os_type = platform.system()
     if os_type not in ['Linux', 'Windows', 'Darwin']:
         print("Unknown OS", os_type)
@@ -129,17 +168,24 @@ def port_search():
         pattern = glob.glob('/dev/ttyACM*')
     if os_type == 'Darwin':
         pattern = glob.glob('/dev/cu.usbmodem*')
-    for port in pattern:
-        try:
-            init(port)
-        except:
-            port = False
-            #cleanup()
-        if port:
-            p = get_pan()
-            if p is None:
-                cleanup()
+    if not pattern:
+        return False
+    # probe every candidate at once, each failure costs a full timeout
+    found = False
+    with ThreadPoolExecutor(max_workers=len(pattern)) as pool:
+        for c in pool.map(probe, pattern):
+            if c is None:
                 continue
-            return True
-    return False
+            if not found:
+                found = True
+                com = c
+                try:
+                    com.set_low_latency_mode(True)
+                except:
+                    pass
+                send_command('velocity', 0, servo_conf['velocity'])
+                send_command('acceleration', 0, servo_conf['acceleration'])
+            else:
+                c.close()
+    return found
 
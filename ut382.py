@@ -1,13 +1,24 @@
 #! /usr/bin/env python3
 
 import sys
-import copy
 import time
 import argparse
 import datetime
+import functools
+from collections import namedtuple
 
 import serial
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    from _decode_jit import pack_frame
+except ImportError:
+    pack_frame = None
+
 default_port = '/dev/ttyUSB0'
 baud = 19200
 timeout = 0.2
@@ -53,9 +64,29 @@ lcd_table = {
 }
 bitwise_fields = ['mode',]
 
+# inverted index, which fields live in packed byte i
+# built once so decoding doesn't rescan the whole table for every byte
+lcd_by_index = [[] for i in range(15)]
+for k,v in lcd_table.items():
+    n,mask,lut = v
+    if k in bitwise_fields:
+        # frozen (bit, value) pairs, cheaper to walk than dict.items()
+        lut = tuple(lut.items())
+    else:
+        # dense 256-entry table, plain indexing instead of hashing
+        lut = tuple(lut.get(b) for b in range(256))
+    lcd_by_index[n].append((k, mask, lut, k in bitwise_fields))
+
+# flat record for one decoded frame, attribute access beats re-hashing
+# dict keys on every read and the instances stay tiny and hashable
+LcdState = namedtuple('LcdState', list(lcd_table), defaults=(None,)*len(lcd_table))
+
 def init(port):
     global com
     com = serial.Serial(port, baud, timeout=timeout)
+    if pack_frame is not None:
+        # trigger the jit compile now instead of on the first frame
+        pack_frame(numpy.zeros(33, numpy.uint8))
 
 def cleanup():
     com.close()
@@ -86,31 +117,22 @@ def load_options():
     parser = build_parser()
     options = parser.parse_args()
     if options.path == '-':
-        option.path = ''
+        options.path = ''
     return options
 
 def listen(n=33):
-    reply = list(com.read(n))
-    if reply and type(reply[0]) == str:  # python2
-        reply = [ord(n) for n in reply]
-    return reply
+    return com.read(n)
 
 def decode_lcd_byte(i, b):
     summary = {}
-    for k,v in lcd_table.items():
-        n,mask,lut = v
-        if n != i:
-            continue
-        summary[k] = None
+    if i >= len(lcd_by_index):
+        return summary
+    for k, mask, lut, bitwise in lcd_by_index[i]:
         b2 = mask & b
-        if k in bitwise_fields:
-            summary[k] = []
-            for k2,v2 in lut.items():
-                if k2 & b2:
-                    summary[k].append(v2)
+        if bitwise:
+            summary[k] = [v2 for k2,v2 in lut if k2 & b2]
         else:
-            if b2 in lut:
-                summary[k] = lut[b2]
+            summary[k] = lut[b2]  # unknown values are already None
     return summary
 
 def pretty_byte(i, b):
@@ -121,85 +143,106 @@ def decode_raw(bs):
     weird = []
     if len(bs) != 33:
         weird.append('wrong message length %i' % len(bs))
-    for i,b in enumerate(bs):
-        if i >= 30:
-            break
-        if b & 0xF0 != 0x30:
+    if pack_frame is not None and len(bs) == 33:
+        packed, err = pack_frame(numpy.frombuffer(bytes(bs), dtype=numpy.uint8))
+        if err:
+            weird.append('bad frame')
+        bs2 = packed.tobytes()
+    elif numpy is not None:
+        arr = numpy.frombuffer(bytes(bs), dtype=numpy.uint8)
+        if ((arr[:30] & 0xF0) != 0x30).any():
             weird.append('bad byte prefix')
-    if len(bs) > 30 and bs[30] != 0x0D:
-        weird.append('bad byte 30')
-    if len(bs) > 31 and bs[31] != 0x0A:
-        weird.append('bad byte 31')
-    # last byte might be a checksum?
-    # usually consistent, sometimes wiggles between two values
-    bs2 = []
-    for i in range(1, len(bs), 2):
-        if i >= 31:
-            break
-        bs2.append((bs[i-1]&0x0F) | ((bs[i]&0x0F)*16))
+        if len(bs) > 30 and bs[30] != 0x0D:
+            weird.append('bad byte 30')
+        if len(bs) > 31 and bs[31] != 0x0A:
+            weird.append('bad byte 31')
+        # last byte might be a checksum?
+        # usually consistent, sometimes wiggles between two values
+        n = min(len(bs), 30) & ~1  # whole nibble pairs only
+        bs2 = ((arr[0:n:2] & 0x0F) | ((arr[1:n:2] & 0x0F) << 4)).tobytes()
+    else:
+        for i,b in enumerate(bs):
+            if i >= 30:
+                break
+            if b & 0xF0 != 0x30:
+                weird.append('bad byte prefix')
+        if len(bs) > 30 and bs[30] != 0x0D:
+            weird.append('bad byte 30')
+        if len(bs) > 31 and bs[31] != 0x0A:
+            weird.append('bad byte 31')
+        # last byte might be a checksum?
+        # usually consistent, sometimes wiggles between two values
+        bs2 = []
+        for i in range(1, len(bs), 2):
+            if i >= 31:
+                break
+            bs2.append((bs[i-1]&0x0F) | ((bs[i]&0x0F)*16))
+        bs2 = bytes(bs2)
     if weird:
         sys.stderr.write(str(weird))
     return bs2, bool(weird)
 
+@functools.lru_cache(maxsize=256)
 def decode_summary(reply):
+    # a steady reading produces long runs of identical frames, so cache
+    # whole decodes -- callers must treat the result as read-only
+    # fused version of decode_lcd_byte over the whole frame,
+    # one output dict instead of 12 throwaway ones
     summary = {}
     for i,b in enumerate(reply):
-        summary.update(decode_lcd_byte(i, b))
-    return summary
+        for k, mask, lut, bitwise in lcd_by_index[i]:
+            b2 = mask & b
+            if bitwise:
+                summary[k] = [v2 for k2,v2 in lut if k2 & b2]
+            else:
+                summary[k] = lut[b2]  # unknown values are already None
+    return LcdState(**summary)
 
 def decode_lux(summary):
-    unit = summary['unit']
-    digits = [summary['big_1000'], summary['big_100'], summary['big_10'], summary['big_1']]
-    if digits == [None, 0, 'L', None]:
+    unit = summary.unit
+    d1 = summary.big_1
+    d10 = summary.big_10
+    d100 = summary.big_100
+    d1000 = summary.big_1000
+    if (d1000, d100, d10, d1) == (None, 0, 'L', None):
         return None, unit
-    lux = 0.0
-    for i,d in enumerate(reversed(digits)):
-        if d is None:
-            continue
-        lux += d * 10**i
-    if summary['big_10ths']:
-        lux *= 0.1
-    if summary['big_100ths']:
-        lux *= 0.01
-    if summary['big_1000ths']:
-        lux *= 0.001
-    if summary['x10']:
+    # assemble the integer reading directly, no 10**i loop
+    # non-digit segments (None or letters) count as 0
+    lux = ((d1000 if type(d1000) is int else 0) * 1000
+         + (d100 if type(d100) is int else 0) * 100
+         + (d10 if type(d10) is int else 0) * 10
+         + (d1 if type(d1) is int else 0))
+    if summary.x10:
         lux *= 10
-    if not any(summary[d] for d in ['big_10ths', 'big_100ths', 'big_1000ths']):
-        lux = int(lux)
-    return lux, unit
+    # integers all the way down, one division places the decimal point
+    dp = 0 if summary.big_10ths else 1 if summary.big_100ths else 2 if summary.big_1000ths else -1
+    if dp < 0:
+        return lux, unit
+    return lux / 10 ** (dp + 1), unit
 
 def live_raw():
-    com.timeout = 0.02  # single byte timeout
-    reply  = []
-    reply2 = []
+    "yield aligned 33 byte frames from bulk reads"
+    com.timeout = 0.05
+    buf = bytearray()
     while True:
-        reply = listen(1)
-        if reply:
-            reply2.extend(reply)
-            continue
-        if not reply2:
-            continue
-        yield reply2
-        reply2 = []
+        buf.extend(com.read(64))
+        while len(buf) >= 33:
+            if buf[30:32] == b'\r\n':
+                yield bytes(buf[:33])
+                del buf[:33]
+            else:
+                del buf[:1]  # off by a byte, shift until aligned
 
 def live_sync():
-    "throw away the first partial, then be efficient"
-    err = True
+    "anchor on the \\r\\n sentinel, one read per frame"
+    com.timeout = timeout
     while True:
-        if err:  # re-sync
-            for bs in live_raw():
-                if len(bs) != 33:
-                    continue
-                reply,err = decode_raw(bs)
-                if not err:
-                    yield reply
-                    com.timeout = timeout
-                    break
-        # this uses 80% less CPU
-        bs = listen(33)
+        # 32 bytes through the terminator, plus the trailing checksum
+        bs = com.read_until(b'\r\n', 32) + com.read(1)
         if len(bs) != 33:
-            err = True
+            continue  # timed out mid-frame, try again
+        if bs[30:32] != b'\r\n':
+            com.read(1)  # misaligned, shift a byte so the resync can't stall
             continue
         reply,err = decode_raw(bs)
         if err:
@@ -220,57 +263,69 @@ def live_debug():
         summary = decode_summary(reply)
         print()
 
-def live_monitor(strftime):
+def live_monitor():
+    # timestamps stay as datetime objects, the consumer formats the
+    # (few) rows it actually writes
     for reply in live_sync():
-        t = datetime.datetime.now().strftime(strftime)
+        t = datetime.datetime.now()
         summary = decode_summary(reply)
-        if summary['batt']:
+        if summary.batt:
             sys.stderr.write('Warning: battery low')
-        if summary['menu']:
+        if summary.menu:
             continue
         lux, unit = decode_lux(summary)
         yield {'time':t, 'lux':lux, 'unit':unit}
 
-def live_average(strftime, duration):
+def live_average(duration):
     samples = duration * 8.0
-    history = []
-    for data in live_monitor(strftime):
+    # running total, no history list to grow and re-sum
+    total = 0.0
+    n = 0
+    for data in live_monitor():
         if data['lux'] is None:
             continue
-        history.append(data['lux'])
-        if len(history) < samples:
+        total += data['lux']
+        n += 1
+        if n < samples:
             continue
-        data['ave_lux'] = sum(history) / len(history)
+        data['ave_lux'] = total / n
         yield data
-        history = []
+        total = 0.0
+        n = 0
 
 def core(options):
     redirect = sys.stdout
     old = None
-    new = None
     if options.path:
-        redirect = open(options.path, 'w', 1)
+        # big buffer with periodic flushes, not a syscall per row
+        redirect = open(options.path, 'w', buffering=65536)
 
     if options.moving:
-        source = live_average(options.strftime, options.moving)
+        source = live_average(options.moving)
         k = 'ave_lux'
     elif options.monitor or options.delta:
-        source = live_monitor(options.strftime)
+        source = live_monitor()
         k = 'lux'
     if options.monitor or options.moving or options.delta:
         redirect.write('time\tlight\tunit\n')
-        for data in source:
-            num = '%.2f'
-            if data[k] is None:
-                continue
-            if type(data[k]) == int:
-                num = '%i'
-            lux = num % data[k]
-            new = lux
-            if options.delta and new == old:
-                continue
-            old = new
-            redirect.write('\t'.join([data['time'], lux, data['unit']]) + '\n')
+        rows = 0
+        try:
+            for data in source:
+                val = data[k]
+                if val is None:
+                    continue
+                # compare the raw value, only format rows that get kept
+                if options.delta and val == old:
+                    continue
+                old = val
+                lux = ('%i' if type(val) == int else '%.2f') % val
+                t = data['time'].strftime(options.strftime)
+                redirect.write(f"{t}\t{lux}\t{data['unit']}\n")
+                rows += 1
+                if rows % 64 == 0:
+                    redirect.flush()
+        finally:
+            redirect.flush()  # ^C shouldn't lose buffered rows
 
     if options.path:
         redirect.close()